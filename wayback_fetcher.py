@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
+import concurrent.futures
 import hashlib
+import io
 import sys
+import time
 import argparse
 import locale
 import os
@@ -10,19 +14,35 @@ import re
 import json
 import csv
 import datetime
-import time
 import traceback
+import urllib.request
 from types import FunctionType, MethodType
-from collections import defaultdict
-import urllib.parse
-import concurrent.futures
+from collections.abc import Iterable, Iterator
+from itertools import compress, count, groupby, tee
+from operator import itemgetter
+from dataclasses import dataclass
+from array import array
 import httpx
 import gettext
 import logging
 from pprint import pformat
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 __author__ = "FazaN"
 
+_DOMAIN_RE = re.compile(r"^(?:[A-Za-z0-9](?:[A-Za-z0-9\-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,}\Z")
+# Used with match() from the start of the filename, so it is not anchored with "^"
+_SUFFIX_RE = re.compile(r"(.*?)-((?:current)|(?:\d{14}))(\.\w+)?$")
+
+# Directories already created by makedirs_cached()
+_mkdir_cache: set[str] = set()
+
+# Numbers the temporary files of download attempts, see download_file()
+_part_counter = count()
+
 def get_logger(name=__name__):
     """
     Return a logger with the given name. If no logger with that name exists,
@@ -45,9 +65,6 @@ def format_exception(exc: Exception|None, with_traceback: bool = False, limit: i
     else:
         return f"{exc.__class__.__module__}.{exc.__class__.__qualname__}: {exc}"
 
-def md5sum(content: bytes) -> str:
-    return hashlib.md5(content).hexdigest()
-
 def get_lang() -> str:
     """
     Peek language flags in sys.argv before argparse and try to get system locale.
@@ -89,8 +106,7 @@ def validate_domain(domain: str, _t: MethodType|FunctionType = lambda x: x) -> s
     Raises:
         argparse.ArgumentTypeError: If the domain does not match the regex pattern.
     """
-    pattern = re.compile(r"^(?:[A-Za-z0-9](?:[A-Za-z0-9\-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,}$")
-    if not pattern.match(domain):
+    if not _DOMAIN_RE.match(domain):
         raise argparse.ArgumentTypeError(_t("Must be a valid domain: {domain}").format(domain=domain))
     return domain.lower()
 
@@ -107,7 +123,7 @@ def boolean_answer(answer: str, default: bool) -> bool:
     """
     if not answer:
         return default
-    return answer.lower().startswith('y') or answer.lower().startswith('д')
+    return answer.lower().startswith(('y', 'д'))
 
 def range_limited_int(minimum: int, maximum: int, _t: MethodType|FunctionType = lambda x: x) -> FunctionType:
     """
@@ -292,21 +308,78 @@ def parse_args(_t: MethodType|FunctionType = lambda x: x) -> argparse.Namespace:
         args.download_timeout_origin = args.download_timeout
     args.output_folder = os.path.join("output", f"{args.domain}_{now}")
     args.output_format = set([args.output_format] if args.output_format != 'both' else ['csv', 'json'])
-    args.extensions = [e.strip().lower() if e.startswith('.') else '.' + e.strip().lower() for e in (args.extensions or '').split(',') if e.strip()]
+    exts = []
+    for e in (args.extensions or '').split(','):
+        e = e.strip().lower()
+        if e:
+            exts.append(e if e.startswith('.') else '.' + e)
+    args.extensions = exts
     args.mimetypes = [m.strip().lower() for m in (args.mimetypes or '').split(',') if m.strip()]
     return args
 
-def fetch_index(domain: str, limit: int, statuscodes: list[int], http: bool = False, _t: MethodType|FunctionType = lambda x: x) -> tuple[list[dict], list]:
+@dataclass
+class Records:
+    """
+    Column-oriented storage for CDX records.
+
+    Every header maps to a column holding one value per record, so header names
+    are stored once instead of being repeated in a dict for every record.
+    Records are addressed by their index in the columns.
+    """
+    headers: list[str]
+    columns: dict[str, list|array]
+
+    def __len__(self) -> int:
+        return len(self.columns[self.headers[0]]) if self.headers else 0
+
+    def rows(self, indices: Iterable[int]|None = None) -> Iterator[tuple]:
+        """
+        Lazily build a tuple of values in header order per record.
+
+        Args:
+            indices (Iterable[int]|None, optional): Indices of records to build. Defaults to None (all records).
+
+        Returns:
+            Iterator[tuple]: An iterator over the records as tuples.
+        """
+        columns = [self.columns[h] for h in self.headers]
+        if indices is None:
+            return zip(*columns)
+        return (tuple(c[i] for c in columns) for i in indices)
+
+    def as_dicts(self, indices: Iterable[int]|None = None) -> Iterator[dict]:
+        """
+        Lazily build a dict per record, e.g. for serialization.
+
+        Args:
+            indices (Iterable[int]|None, optional): Indices of records to build. Defaults to None (all records).
+
+        Returns:
+            Iterator[dict]: An iterator over the records as dicts.
+        """
+        headers, columns = self.headers, self.columns
+        if indices is None:
+            indices = range(len(self))
+        return ({h: columns[h][i] for h in headers} for i in indices)
+
+def fetch_index(domain: str, limit: int, statuscodes: list[int], http: bool = False, _t: MethodType|FunctionType = lambda x: x, page_size: int = 10000, retries: int = 3, retries_delay: int = 5) -> Records:
     """Fetch the archive index from the Wayback Machine using the CDX API.
 
+    The index is requested in pages of up to `page_size` records chained with CDX resumption keys,
+    and every page is appended to the columns as soon as it is parsed, so only one raw page is held in memory at a time.
+    A non-positive limit is passed to the API as is (a negative limit means "last N records") in a single request.
+
     Args:
         domain (str): The domain to fetch the archive index for.
         limit (int): The maximum number of records to fetch.
         statuscodes (list[int]): The HTTP status codes to filter the results by.
         _t (MethodType|FunctionType, optional): A translation function for internationalization. Defaults to lambda x: x.
+        page_size (int, optional): The maximum number of records to request at once. Defaults to 10000.
+        retries (int, optional): The number of attempts to fetch a page if it fails with 5xx, 429, timeout or connection error. Defaults to 3.
+        retries_delay (int, optional): The delay in seconds before the first retry, growing with every attempt. Defaults to 5.
 
     Returns:
-        tuple[list[dict], list]: A tuple containing the list of records and the list of headers.
+        Records: The fetched records.
     """
     _logger = get_logger()
     api = f"{'http' if http else 'https'}://web.archive.org/cdx/search/cdx"
@@ -317,66 +390,128 @@ def fetch_index(domain: str, limit: int, statuscodes: list[int], http: bool = Fa
         "output": "json",
         "fl": "original,mimetype,timestamp,endtimestamp,groupcount,uniqcount",
         "collapse": "urlkey",
-        "limit": str(limit),
+        "showResumeKey": "true",
     }
     if statuscodes:
         params['filter'] = [f"statuscode:{c}" for c in statuscodes]
 
-    client = httpx.Client(timeout=120)
+    headers, columns = [], {}
+    fetched, resume_key = 0, None
     print(_t("Fetching archive index..."))
-    try:
-        resp = client.get(api, params=params)
-        resp.raise_for_status()
-    except Exception as e:
-        _logger.critical(_t('Error while fetching archive index ({exception})').format(exception=format_exception(e)))
-        sys.exit(1)
-
-    data = resp.json()
-    headers = data[0] if data else []
-    records = []
-    for row in data[1:]:
-        rec = dict(zip(headers, row))
-        rec["groupcount"] = int(rec.get("groupcount", "0"))
-        rec["uniqcount"]  = int(rec.get("uniqcount",  "0"))
-        records.append(rec)
-    return records, headers
+    with httpx.Client(timeout=120) as client:
+        while True:
+            params["limit"] = str(min(page_size, limit - fetched) if limit > 0 else limit)
+            if resume_key:
+                params["resumeKey"] = resume_key
+            for i in range(1, max(retries, 1) + 1):
+                try:
+                    resp = client.get(api, params=params)
+                    resp.raise_for_status()
+                    break
+                except Exception as e:
+                    if i >= retries or not any((isinstance(e, (httpx.TimeoutException, httpx.ConnectError)), (isinstance(e, httpx.HTTPStatusError) and (e.response.status_code == 429 or 500 <= e.response.status_code < 600)))):
+                        _logger.critical(_t('Error while fetching archive index ({exception})').format(exception=format_exception(e)))
+                        sys.exit(1)
+                    _logger.debug(_t("Error ({exception}) while downloading {url}, retrying").format(url=api, exception=format_exception(e)))
+                    time.sleep(retries_delay * i)
+
+            data = orjson.loads(resp.content) if orjson else resp.json()
+            del resp
+            # With showResumeKey, a page that has more results after it ends with an empty row and the resumption key
+            resume_key = None
+            if len(data) >= 2 and not data[-2]:
+                resume_key = data[-1][0]
+                del data[-2:]
+            if len(data) < 2:
+                break
+            if not headers:
+                headers = data[0]
+                columns = {h: array("q") if h in ("groupcount", "uniqcount") else [] for h in headers}
+            # Transpose the page into columns with zip() and convert counts with map(), both running in C
+            for h, values in zip(headers, zip(*data[1:])):
+                column = columns[h]
+                column.extend(map(int, values) if isinstance(column, array) else values)
+            fetched += len(data) - 1
+            if not resume_key or limit <= 0 or fetched >= limit:
+                break
+    return Records(headers, columns)
 
-def filter_records(records: list[dict], exts: list[str]|None = None, mtypes: list[str]|None = None, regex: str|None = None) -> tuple[list[dict], list[dict]]:
+def extract_url_path(url: str) -> str:
     """
-    Filter the list of records based on the given criteria.
+    Extract the path component of an absolute URL.
+
+    A lightweight replacement for urllib.parse.urlparse(url).path for use in per-record loops:
+    it slices the path out of the string without building a ParseResult.
 
     Args:
-        records (list[dict]): The list of records to filter.
+        url (str): The URL to extract the path from, e.g. "https://example.com/path/file.ext?query".
+
+    Returns:
+        str: The URL-path (without query, fragment and parameters), or an empty string if there is none.
+    """
+    start = url.find("://")
+    start = start + 3 if start >= 0 else 0
+    end = len(url)
+    for c in "?#":
+        i = url.find(c, start, end)
+        if i >= 0:
+            end = i
+    start = url.find("/", start, end)
+    if start < 0:
+        return ""
+    # Like urlparse(), drop ";parameters" of the last path segment
+    i = url.find(";", url.rfind("/", start, end), end)
+    if i >= 0:
+        end = i
+    return url[start:end]
+
+def filter_records(records: Records, exts: list[str]|None = None, mtypes: list[str]|None = None, regex: str|None = None) -> tuple[range|list[int], list[int]]:
+    """
+    Filter the records based on the given criteria.
+
+    Args:
+        records (Records): The records to filter.
         exts (list[str]|None, optional): The list of file extensions to filter by. Defaults to None.
         mtypes (list[str]|None, optional): The list of MIME types to filter by. Defaults to None.
         regex (str|None, optional): The regular expression to filter by. Defaults to None.
 
     Returns:
-        tuple[list[dict], list[dict]]: A tuple containing the list of filtered records and the list of non-unique records.
+        tuple[range|list[int], list[int]]: A tuple containing the indices of filtered records and the indices of non-unique records.
     """
     if not exts and not mtypes and not regex:
-        filtered = records
+        filtered = range(len(records))
     else:
-        filtered = []
-        for r in records:
-            path = urllib.parse.urlparse(r["original"]).path
-            ext = os.path.splitext(path)[1].lower()
-            mt  = r["mimetype"].lower()
-            if (exts and ext and ext in exts) or (mtypes and mt and mt in mtypes) or (regex and re.search(regex, path)):
-                filtered.append(r)
-    nonuniq = [r for r in filtered if r["uniqcount"] >= 2]
+        # Each criterion is evaluated over a whole column with map() chains, and the resulting
+        # mask is applied with compress(), so the per-record loop runs in C rather than in bytecode.
+        # The user regex and the extensions are compiled separately, so flags or comments of the
+        # user regex can not affect the extension check.
+        masks = []
+        if exts or regex:
+            paths = map(extract_url_path, records.columns["original"])
+            ext_paths, regex_paths = tee(paths) if exts and regex else (paths, paths)
+            if exts:
+                ext_pat = re.compile(r"(?<!/)\.(?:" + "|".join(re.escape(e.lstrip(".")) for e in exts) + r")$", re.IGNORECASE)
+                masks.append(map(ext_pat.search, ext_paths))
+            if regex:
+                masks.append(map(re.compile(regex).search, regex_paths))
+        if mtypes:
+            masks.append(map(set(mtypes).__contains__, map(str.lower, records.columns["mimetype"])))
+        mask = masks[0] if len(masks) == 1 else map(any, zip(*masks))
+        filtered = list(compress(range(len(records)), mask))
+    uniqcount = records.columns["uniqcount"]
+    nonuniq = [i for i in filtered if uniqcount[i] >= 2]
     return filtered, nonuniq
 
-def save_metadata(folder: str, name: str, headers: list[str], data: list[dict], formats: list[str]):
+def save_metadata(folder: str, name: str, records: Records, formats: list[str], indices: Iterable[int]|None = None):
     """
     Save metadata to the specified folder in the given formats.
 
     Args:
         folder (str): The folder to save the metadata to.
         name (str): The base name of the file to save.
-        headers (list[str]): The list of header names.
-        data (list[dict]): The data (list of dictionaries) to save.
+        records (Records): The records to save.
         formats (list[str]): The list of formats to save the data in. Currently, only 'csv' and 'json' are supported.
+        indices (Iterable[int]|None, optional): Indices of records to save. Defaults to None (all records).
 
     Returns:
         None
@@ -385,38 +520,70 @@ def save_metadata(folder: str, name: str, headers: list[str], data: list[dict],
     base = os.path.join(folder, name)
     if 'csv' in formats:
         with open(f"{base}.csv", "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=headers, delimiter=";", quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            writer.writeheader()
-            writer.writerows(data)
+            writer = csv.writer(f, delimiter=";", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(records.headers)
+            writer.writerows(records.rows(indices))
     if 'json' in formats:
-        with open(f"{base}.json", "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        data = list(records.as_dicts(indices))
+        if orjson:
+            with open(f"{base}.json", "wb") as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
 
-def build_filepath(rec: dict, out_files: str, structured: bool, which: str) -> str:
+def makedirs_cached(dirpath: str) -> None:
     """
-    Build the filepath for a given record.
+    Create a directory (and its parents) unless it was already created by this function.
 
     Args:
-        rec (dict): A record with the "original" key containing the URL.
+        dirpath (str): The directory to create.
+
+    Returns:
+        None
+    """
+    if dirpath not in _mkdir_cache:
+        os.makedirs(dirpath, exist_ok=True)
+        _mkdir_cache.add(dirpath)
+
+def prepare_filepath(original: str, out_files: str, structured: bool) -> tuple[str, str, str]:
+    """
+    Compute the parts of the filepath shared by all downloaded versions of a record and create its directory.
+
+    Args:
+        original (str): The original URL of the record.
         out_files (str): The base output folder.
         structured (bool): Whether to use a structured output format.
-        which (str): The filename suffix, e.g. 'first', 'last', 'current'.
 
     Returns:
-        str: The filepath for the given record.
+        tuple[str, str, str]: A tuple containing the directory, the filename without extension and the extension,
+            to be passed to build_filepath().
     """
-    url_path = urllib.parse.urlparse(rec["original"]).path.lstrip("/")
+    url_path = extract_url_path(original).lstrip("/")
     name, ext = os.path.splitext(url_path)
-    suffix = f"-{which}"
     if structured:
         dirpath = os.path.join(out_files, os.path.dirname(url_path))
-        os.makedirs(dirpath, exist_ok=True)
-        filename = f"{os.path.basename(name)}{suffix}{ext}"
-        return os.path.join(dirpath, filename)
-    flat = name.replace("/", "_")
-    filename = f"{flat}{suffix}{ext}"
-    os.makedirs(out_files, exist_ok=True)
-    return os.path.join(out_files, filename)
+        name = os.path.basename(name)
+    else:
+        dirpath = out_files
+        name = name.replace("/", "_")
+    makedirs_cached(dirpath)
+    return dirpath, name, ext
+
+def build_filepath(dirpath: str, name: str, ext: str, which: str) -> str:
+    """
+    Build the filepath for a given version of a record.
+
+    Args:
+        dirpath (str): The directory, as returned by prepare_filepath().
+        name (str): The filename without extension, as returned by prepare_filepath().
+        ext (str): The extension, as returned by prepare_filepath().
+        which (str): The filename suffix, e.g. timestamp or 'current'.
+
+    Returns:
+        str: The filepath for the given version of a record.
+    """
+    return os.path.join(dirpath, f"{name}-{which}{ext}")
 
 def extract_base_and_suffix(filepath: str) -> tuple[str, str]:
     """
@@ -429,15 +596,16 @@ def extract_base_and_suffix(filepath: str) -> tuple[str, str]:
     Returns:
         tuple[str, str]: A tuple containing the base filename and the suffix.
     """
-    dirname = os.path.dirname(filepath)
-    filename = os.path.basename(filepath)
-    m = re.match(r"^(.*?)-((?:current)|(?:\d{14}))(\.\w+)?$", filename)
+    # Match the filename in place instead of splitting the filepath with os.path
+    sep = filepath.rfind(os.sep)
+    if os.altsep:
+        sep = max(sep, filepath.rfind(os.altsep))
+    m = _SUFFIX_RE.match(filepath, sep + 1)
     if m:
-        name = m.group(1)
-        ext = m.group(3) or ''
-        base = os.path.join(dirname, f"{name}{ext}") if name or ext else dirname
-        suffix = m.group(2)
-        return base, suffix
+        name, suffix, ext = m.groups()
+        if name or ext:
+            return f"{filepath[:sep + 1]}{name}{ext or ''}", suffix
+        return os.path.dirname(filepath), suffix
     return filepath, ""
 
 def delete_files(files: list[str], _t: MethodType|FunctionType = lambda x: x) -> None:
@@ -452,31 +620,44 @@ def delete_files(files: list[str], _t: MethodType|FunctionType = lambda x: x) ->
         None
     """
     _logger = get_logger()
+    msg_deleting = _t("Deleting: {filepath}")
     for f in files:
-        _logger.debug(_t("Deleting: {filepath}").format(filepath=f))
+        _logger.debug(msg_deleting.format(filepath=f))
         os.remove(f)
 
-def find_duplicates(downloads: list[tuple[str, str|None, str|None, bool, str|None]], _t: MethodType|FunctionType = lambda x: x) -> list[str]:
+def file_md5sum(filepath: str) -> str|None:
+    """
+    Calculate the MD5 checksum of a file, reading it in chunks.
+
+    Args:
+        filepath (str): The file to checksum.
+
+    Returns:
+        str|None: The hex MD5 digest of the file, or None if the file is missing.
     """
-    Find duplicate files in a list of downloads based on MD5 sums, and return a list of files to delete (excluding most recent copy).
+    try:
+        with open(filepath, "rb") as f:
+            return hashlib.file_digest(f, "md5").hexdigest()
+    except FileNotFoundError:
+        return None
+
+def find_duplicates(filepaths: list[str], threads: int = 1, _t: MethodType|FunctionType = lambda x: x) -> list[str]:
+    """
+    Find duplicate files among downloaded files based on MD5 sums, and return a list of files to delete (excluding most recent copy).
+
+    Only copies of the same file (sharing a base filename) can be duplicates, so MD5 sums are calculated
+    only for files whose base is shared with other downloaded files.
 
     Args:
-        downloads (list[tuple[str, str|None, str|None, bool, str|None]]): A list of download records, where each record is a tuple of (url, filepath, md5sum, success, error).
+        filepaths (list[str]): A list of downloaded filepaths.
+        threads (int): The number of threads for calculating MD5 sums. Defaults to 1.
         _t (MethodType|FunctionType): A translation function for internationalization. Defaults to lambda x: x.
 
     Returns:
         list[str]: A list of files to delete.
     """
     _logger = get_logger()
-    groups = defaultdict(list)
-    for _url, filepath, md5sum, _success, _error in downloads:
-        if not filepath or not md5sum:
-            continue
-        base, suffix = extract_base_and_suffix(filepath)
-        groups[(md5sum, base)].append((filepath, suffix))
-    
-    files_to_delete = []
-    
+
     def freshness_score(suffix):
         if suffix == "current":
             return float('inf')
@@ -485,23 +666,61 @@ def find_duplicates(downloads: list[tuple[str, str|None, str|None, bool, str|Non
         else:
             return 0
 
-    for _key, filelist in groups.items():
-        if len(filelist) < 2:
-            continue  # no duplicates
-        # Sort by freshness (most recent copy first)
-        filelist_sorted = sorted(filelist, key=lambda x: freshness_score(x[1]), reverse=True)
-        latest = filelist_sorted[0][0]
-        duplicates = [f[0] for f in filelist_sorted[1:]]
-        _logger.debug(_t("File {latest} has {duplicates_count} duplicates: {duplicates}").format(latest=latest, duplicates_count=len(duplicates), duplicates=duplicates))
-        files_to_delete.extend(duplicates)
+    # Several downloads may have been saved to the same path, it must be checked (and kept) only once
+    filepaths = list(dict.fromkeys(filepaths))
+
+    # Sort by (base, most recent copy first), so copies of the same file form a run of consecutive entries
+    entries = []
+    for filepath in filepaths:
+        base, suffix = extract_base_and_suffix(filepath)
+        entries.append((base, -freshness_score(suffix), filepath))
+    entries.sort()
+    groups = [copies for copies in (list(g) for _base, g in groupby(entries, key=itemgetter(0))) if len(copies) > 1]
+
+    to_hash = [filepath for copies in groups for _base, _score, filepath in copies]
+    if threads > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as ex:
+            md5sums = dict(zip(to_hash, ex.map(file_md5sum, to_hash)))
+    else:
+        md5sums = dict(zip(to_hash, map(file_md5sum, to_hash)))
+
+    files_to_delete = []
+    msg_duplicates = _t("File {latest} has {duplicates_count} duplicates: {duplicates}")
+    def md5sum_of(entry):
+        return md5sums[entry[2]]
+
+    for copies in groups:
+        copies = [e for e in copies if md5sum_of(e) is not None]
+        # Sorting is stable, so copies with the same MD5 sum stay ordered by freshness
+        copies.sort(key=md5sum_of)
+        for _md5sum, same in groupby(copies, key=md5sum_of):
+            latest, *duplicates = (e[2] for e in same)
+            if not duplicates:
+                continue
+            _logger.debug(msg_duplicates.format(latest=latest, duplicates_count=len(duplicates), duplicates=duplicates))
+            files_to_delete.extend(duplicates)
 
     return files_to_delete
 
-def download_file(url: str, filepath: str, timeout: int, retries: int = 1, retries_delay: int = 5, calc_md5sum: bool = False, _t: MethodType|FunctionType = lambda x: x) -> tuple[str, str|None, str|None, bool, str|None]:
+def write_all(f: io.FileIO, data: bytes|bytearray) -> None:
+    """
+    Write all the given data to an unbuffered file, repeating the write if it was partial.
+
+    Args:
+        f (io.FileIO): The file to write to.
+        data (bytes|bytearray): The data to write.
+    """
+    with memoryview(data) as view:
+        while view:
+            view = view[f.write(view):]
+
+async def download_file(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str, filepath: str, timeout: int, retries: int = 1, retries_delay: int = 5, _t: MethodType|FunctionType = lambda x: x) -> tuple[str, str|None, bool, str|None]:
     """
-    Download a file from a given URL and save it to the given filepath.
+    Download a file from a given URL and stream it to the given filepath.
 
     Args:
+        client (httpx.AsyncClient): A shared HTTP client, so connections are reused between downloads.
+        semaphore (asyncio.Semaphore): A semaphore limiting the number of concurrent downloads.
         url (str): The URL to download from.
         filepath (str): The filepath to save the file to.
         timeout (int): The timeout for the HTTP request.
@@ -511,29 +730,125 @@ def download_file(url: str, filepath: str, timeout: int, retries: int = 1, retri
             Defaults to lambda x: x.
 
     Returns:
-        tuple[str, str|None, str|None, bool, str|None]: A tuple containing the URL, download filepath,
-            MD5 checksum of a downloaded file, a boolean indicating whether the download was successful,
-            and an error message if it was not.
+        tuple[str, str|None, bool, str|None]: A tuple containing the URL, download filepath,
+            a boolean indicating whether the download was successful, and an error message if it was not.
     """
     _logger = get_logger()
     retries = retries if retries > 0 else 1
     last_exception, i = None, 0
     for i in range(1, retries + 1):
         try:
-            r = httpx.get(url, timeout=timeout)
-            r.raise_for_status()
-            with open(filepath, "wb") as f:
-                f.write(r.content)
-            _logger.debug(_t("Saved: {url} -> {filepath}").format(url=url, filepath=filepath))
-            return url, filepath, md5sum(r.content), True, None
+            async with semaphore, client.stream("GET", url, timeout=timeout) as r:
+                r.raise_for_status()
+                # Each attempt writes to a file of its own and moves it into place once complete, so a failed
+                # transfer never truncates or deletes a file saved by another download sharing the same path.
+                part = f"{filepath}.{os.getpid()}-{next(_part_counter)}.part"
+                # Disk I/O runs in worker threads, so a slow disk does not stall other downloads.
+                # The file is unbuffered: 64 KiB chunks are collected into 1 MiB blocks instead,
+                # so a write (and a thread hop) happens once per block, not per chunk.
+                f = await asyncio.to_thread(io.FileIO, part, "xb")
+                try:
+                    try:
+                        block = bytearray()
+                        async for chunk in r.aiter_bytes(65536):
+                            block += chunk
+                            if len(block) >= 1 << 20:
+                                await asyncio.to_thread(write_all, f, block)
+                                block.clear()
+                        if block:
+                            await asyncio.to_thread(write_all, f, block)
+                    finally:
+                        await asyncio.to_thread(f.close)
+                    await asyncio.to_thread(os.replace, part, filepath)
+                except BaseException:
+                    # Do not leave a truncated file behind if the transfer was interrupted
+                    if os.path.exists(part):
+                        os.remove(part)
+                    raise
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug(_t("Saved: {url} -> {filepath}").format(url=url, filepath=filepath))
+            return url, filepath, True, None
         except Exception as e:
             last_exception = e
-            if i == retries or not any((isinstance(e, httpx.TimeoutException), (isinstance(e, httpx.HTTPStatusError) and 500 <= e.response.status_code < 600), isinstance(e, httpx.ConnectError))):
+            # Connection failures are already retried by the client transports (see download_all)
+            if i == retries or not any((isinstance(e, httpx.TimeoutException) and not isinstance(e, httpx.ConnectTimeout), (isinstance(e, httpx.HTTPStatusError) and 500 <= e.response.status_code < 600))):
                 _logger.warning(_t("Error while downloading {url} ({exception})").format(url=url, exception=format_exception(e)))
                 break
             _logger.debug(_t("Error ({exception}) while downloading {url}, retrying").format(url=url, exception=format_exception(e)))
-            time.sleep(retries_delay)
-    return url, None, None, False, f"{format_exception(last_exception)}, retries: {i}"
+            await asyncio.sleep(retries_delay)
+    return url, None, False, f"{format_exception(last_exception)}, retries: {i}"
+
+def proxy_mounts(limits: httpx.Limits, retries: int) -> dict[str, httpx.AsyncHTTPTransport|None]:
+    """
+    Build client mounts that route requests through the proxies configured in the environment.
+
+    A client created with its own transport ignores HTTP(S)_PROXY, ALL_PROXY and NO_PROXY,
+    so the proxied transports are mounted explicitly, the same way httpx does it by default.
+
+    Args:
+        limits (httpx.Limits): The connection pool limits of each transport.
+        retries (int): The number of times each transport retries a failed connection.
+
+    Returns:
+        dict[str, httpx.AsyncHTTPTransport|None]: The mounts for httpx.AsyncClient. None routes
+            a pattern excluded by NO_PROXY to the client's own (direct) transport.
+    """
+    proxies = urllib.request.getproxies()
+    no_proxy = [host.strip() for host in proxies.pop("no", "").split(",") if host.strip()]
+    if "*" in no_proxy:
+        return {}
+
+    mounts = {}
+    for scheme, proxy in proxies.items():
+        if scheme not in ("http", "https", "all") or not proxy:
+            continue
+        if "://" not in proxy:
+            proxy = f"http://{proxy}"
+        mounts[f"{scheme}://"] = httpx.AsyncHTTPTransport(http2=True, limits=limits, retries=retries, proxy=proxy)
+    if not mounts:
+        return mounts
+
+    for host in no_proxy:
+        if ":" in host and not host.startswith("["):
+            mounts[f"all://[{host}]"] = None
+        elif host.replace(".", "").isdigit() or host.lower() == "localhost":
+            mounts[f"all://{host}"] = None
+        else:
+            mounts[f"all://*{host}"] = None
+    return mounts
+
+async def download_all(tasks: list[tuple[str, str, int]], threads: int, retries: int = 1, retries_delay: int = 5, _t: MethodType|FunctionType = lambda x: x) -> list[tuple[str, str|None, bool, str|None]]:
+    """
+    Download all the given files concurrently over a single HTTP client.
+
+    Args:
+        tasks (list[tuple[str, str, int]]): A list of download tasks, where each task is a tuple of (url, filepath, timeout).
+        threads (int): The maximum number of concurrent downloads.
+        retries (int): The number of times to retry a download if it fails with 5xx or timeout.
+            Also used as the number of connection attempts made by the client transports.
+        retries_delay (int): The delay in seconds between retries.
+        _t (MethodType|FunctionType): A translation function for internationalization.
+            Defaults to lambda x: x.
+
+    Returns:
+        list[tuple[str, str|None, bool, str|None]]: The results of download_file() for each task, in order.
+    """
+    semaphore = asyncio.Semaphore(threads)
+    limits = httpx.Limits(max_connections=threads * 4, max_keepalive_connections=threads * 2)
+    # Failed connections are retried inside the transports, without going through download_file()
+    transport = httpx.AsyncHTTPTransport(http2=True, limits=limits, retries=max(retries - 1, 0))
+    mounts = proxy_mounts(limits, max(retries - 1, 0))
+    async with httpx.AsyncClient(transport=transport, mounts=mounts, follow_redirects=True) as client:
+        if threads == 1:
+            # Nothing runs concurrently, so await downloads one by one instead of scheduling a task for each
+            return [
+                await download_file(client, semaphore, url, path, to, retries, retries_delay, _t)
+                for url, path, to in tasks
+            ]
+        return await asyncio.gather(*[
+            download_file(client, semaphore, url, path, to, retries, retries_delay, _t)
+            for url, path, to in tasks
+        ])
 
 def exit(output_folder: bool=False, _t: MethodType|FunctionType = lambda x: x):
     """
@@ -572,18 +887,18 @@ def main():
     _logger.debug(_t("Using language: {lang_code}").format(lang_code=lang))
     _logger.debug(_t("Given arguments: {args}").format(args=pformat(vars(args))))
 
-    records, headers = fetch_index(args.domain, args.limit, args.statuscodes, args.http, _t)
+    records = fetch_index(args.domain, args.limit, args.statuscodes, args.http, _t)
     if not records:
         _logger.warning(_t("WayBack Machine returned empty result. Probably, the archive is empty."))
         return exit(False, _t)
 
     filtered, nonuniq = filter_records(records, args.extensions, args.mimetypes, args.regex)
 
-    save_metadata(args.output_folder, "full-index", headers, records, args.output_format)
-    if filtered and filtered != records:
-        save_metadata(args.output_folder, "targets", headers, filtered, args.output_format)
+    save_metadata(args.output_folder, "full-index", records, args.output_format)
+    if filtered and len(filtered) != len(records):
+        save_metadata(args.output_folder, "targets", records, args.output_format, filtered)
     if nonuniq:
-        save_metadata(args.output_folder, "multiple-versions", headers, nonuniq, args.output_format)
+        save_metadata(args.output_folder, "multiple-versions", records, args.output_format, nonuniq)
     
     print(_t("Index fetched! Summary:"))
     print(_t("Total: {total}, Targets: {targets}, With multiple versions: {multiple}").format(total=len(records), targets=len(filtered), multiple=len(nonuniq)))
@@ -602,44 +917,45 @@ def main():
         out_files = os.path.join(args.output_folder, "files")
         os.makedirs(out_files, exist_ok=True)
             
+        originals = records.columns['original']
+        timestamps = records.columns['timestamp']
+        endtimestamps = records.columns['endtimestamp']
         tasks = []
-        for rec in filtered:
+        for i in filtered:
+            original, timestamp, endtimestamp = originals[i], timestamps[i], endtimestamps[i]
+            dirpath, name, ext = prepare_filepath(original, out_files, args.structured)
             if args.download_first:
-                url = f"{'http' if args.http else 'https'}://web.archive.org/web/{rec['timestamp']}im_/{rec['original']}"
-                path = build_filepath(rec, out_files, args.structured, rec['timestamp'])
+                url = f"{'http' if args.http else 'https'}://web.archive.org/web/{timestamp}im_/{original}"
+                path = build_filepath(dirpath, name, ext, timestamp)
                 tasks.append((url, path, args.download_timeout_wayback))
-            if args.download_last and (not args.download_first or rec['endtimestamp'] != rec['timestamp']):
-                url = f"{'http' if args.http else 'https'}://web.archive.org/web/{rec['endtimestamp']}im_/{rec['original']}"
-                path = build_filepath(rec, out_files, args.structured, rec['endtimestamp'])
+            if args.download_last and (not args.download_first or endtimestamp != timestamp):
+                url = f"{'http' if args.http else 'https'}://web.archive.org/web/{endtimestamp}im_/{original}"
+                path = build_filepath(dirpath, name, ext, endtimestamp)
                 tasks.append((url, path, args.download_timeout_wayback))
             if args.download_current:
-                url = rec['original']
-                path = build_filepath(rec, out_files, args.structured, "current")
+                url = original
+                path = build_filepath(dirpath, name, ext, "current")
                 tasks.append((url, path, args.download_timeout_origin))
         
         print("\n", _t("Start downloading desired files ({files_count})...").format(files_count=len(tasks)), sep='')
         if len(tasks) > len(filtered):
             print(_t("Note that quantity of files to download is higher than quantity of target records.\nThis is normal as we will download multiple versions of these files.\n"))
-        with concurrent.futures.ThreadPoolExecutor(max_workers=args.threads) as ex:
-            futures = [
-                ex.submit(download_file, url, path, to, args.download_retries, args.download_retries_delay, args.deduplicate, _t)
-                for url, path, to in tasks
-            ]
-            concurrent.futures.wait(futures)
-        
-        results = [f.result() for f in futures]
-        unsuccessful_downloads = [{"URL": r[0], "Error": r[4]} for r in results if not r[3]]
-        successful_downloads = [r for r in results if r[3]]
+        results = asyncio.run(download_all(tasks, args.threads, args.download_retries, args.download_retries_delay, _t))
+        unsuccessful_downloads = Records(["URL", "Error"], {
+            "URL": [r[0] for r in results if not r[2]],
+            "Error": [r[3] for r in results if not r[2]],
+        })
+        successful_downloads = [r[1] for r in results if r[2]]
         
         print('\n', _t("Download complete."), sep='')
         print(_t("Successfully downloaded {successful_count} files.").format(successful_count=len(successful_downloads)))
         print(_t("Failed to download {unsuccessful_count} files.").format(unsuccessful_count=len(unsuccessful_downloads)))
         if unsuccessful_downloads:
-            save_metadata(args.output_folder, "unsuccessful-downloads", ["URL", "Error"], unsuccessful_downloads, args.output_format)
+            save_metadata(args.output_folder, "unsuccessful-downloads", unsuccessful_downloads, args.output_format)
         
         if args.deduplicate:
             print("\n", _t("Searching for duplicates in downloaded files ({files_count})...").format(files_count=len(successful_downloads)), sep='')
-            duplicates = find_duplicates(successful_downloads)
+            duplicates = find_duplicates(successful_downloads, args.threads, _t)
             print(_t("Found {duplicates_count} duplicates. Deleting...").format(duplicates_count=len(duplicates)))
             delete_files(duplicates, _t)
             print(_t("Deduplication complete."))